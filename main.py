@@ -5,18 +5,30 @@ It reads the env variables from the .env file and uses them to initialize the Q&
 It has a chat endpoint that allows you to chat with the agent.
 """
 
+import asyncio
 import logging
+import multiprocessing
 import os
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
 from contextlib import asynccontextmanager
-from typing import Dict, Any
+from typing import Dict, Any, List
 
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Cookie, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
+from langchain.schema import BaseMessage
+import orjson
 import uvicorn
 from dotenv import load_dotenv
 
 from qa_agent import DomainQAAgent
+from scraping_tool import WebScrapingTool
+from search_tool import create_http_client
+from prompt_cache import create_prompt_cache
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -63,6 +75,13 @@ def build_config() -> Dict[str, Any]:
         logger.warning(f"Invalid SEARCH_DEPTH '{search_depth}', using default: basic")
         search_depth = "basic"
 
+    search_return_mode = os.getenv("SEARCH_RETURN_MODE", "summary")
+    if search_return_mode not in ["raw", "summary", "both"]:
+        logger.warning(
+            f"Invalid SEARCH_RETURN_MODE '{search_return_mode}', using default: summary"
+        )
+        search_return_mode = "summary"
+
     # Get CSV file path from environment, default to sites_data.csv
     csv_file_path = os.getenv("CSV_FILE_PATH", "sites_data.csv")
     instance_name = os.getenv("INSTANCE_NAME", "qa-agent")
@@ -73,22 +92,81 @@ def build_config() -> Dict[str, Any]:
         "max_results": get_int_env("MAX_RESULTS", 10),
         "search_depth": search_depth,
         "max_content_size": get_int_env("MAX_CONTENT_SIZE", 10000),
+        "search_token_budget": get_int_env("SEARCH_TOKEN_BUDGET", 24000),
+        "search_cache_max_entries": get_int_env("SEARCH_CACHE_MAX_ENTRIES", 512),
+        "search_cache_ttl": get_int_env("SEARCH_CACHE_TTL", 900),
         "max_scrape_length": get_int_env("MAX_SCRAPE_LENGTH", 20000),
+        "parse_workers": get_int_env("PARSE_WORKERS", os.cpu_count() or 1),
+        "speculative_scrape_urls": get_int_env("SPECULATIVE_SCRAPE_URLS", 2),
+        "scrape_cache_max_entries": get_int_env("SCRAPE_CACHE_MAX_ENTRIES", 256),
+        "scrape_cache_ttl": get_int_env("SCRAPE_CACHE_TTL", 900),
         "enable_search_summarization": os.getenv(
             "ENABLE_SEARCH_SUMMARIZATION", "false"
         ).lower()
         == "true",
+        "search_return_mode": search_return_mode,
         "llm_temperature": get_float_env("LLM_TEMPERATURE", 0.1),
         "llm_max_tokens": get_int_env("LLM_MAX_TOKENS", 3000),
         "request_timeout": get_int_env("REQUEST_TIMEOUT", 30),
         "llm_timeout": get_int_env("LLM_TIMEOUT", 60),
+        "history_token_budget": get_int_env("HISTORY_TOKEN_BUDGET", 2000),
+        "enable_prompt_cache": os.getenv("ENABLE_PROMPT_CACHE", "true").lower()
+        == "true",
+        "prompt_cache_max_entries": get_int_env("PROMPT_CACHE_MAX_ENTRIES", 512),
+        "prompt_cache_ttl": get_int_env("PROMPT_CACHE_TTL", 3600),
+        "prompt_cache_similarity": get_float_env("PROMPT_CACHE_SIMILARITY", 0.93),
         "csv_file_path": csv_file_path,
         "instance_name": instance_name,
     }
 
 
-# Global agent store
-agents: Dict[str, DomainQAAgent] = {}
+# Session lifetime in seconds, matches the session cookie max_age
+SESSION_TTL = get_int_env("SESSION_TTL", 3600)
+
+# Per-session conversation history, the agent itself is shared.
+# Idle sessions expire after SESSION_TTL, the least recent are evicted at capacity.
+session_histories: TTLCache = TTLCache(
+    maxsize=get_int_env("MAX_SESSIONS", 10_000), ttl=SESSION_TTL
+)
+sessions_lock = asyncio.Lock()
+
+# Serializes turns within a session so concurrent requests can't interleave history
+session_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+# Turns holding or queued on each session lock. lock.locked() is briefly
+# False while the lock is handed to the next waiter, so it can't tell idle.
+session_lock_users: Dict[str, int] = defaultdict(int)
+
+
+@asynccontextmanager
+async def session_turn(session_id: str):
+    """Run one turn of a session under its lock"""
+    session_lock_users[session_id] += 1
+    try:
+        async with session_locks[session_id]:
+            yield
+    finally:
+        session_lock_users[session_id] -= 1
+        if not session_lock_users[session_id]:
+            del session_lock_users[session_id]
+
+
+def prune_session_locks() -> None:
+    """Drop idle locks of sessions that are no longer stored"""
+    for session_id in list(session_locks):
+        if (
+            session_id not in session_histories
+            and session_id not in session_lock_users
+        ):
+            del session_locks[session_id]
+
+
+async def expire_sessions(interval: int = 60) -> None:
+    """Periodically reclaim expired sessions instead of waiting for access"""
+    while True:
+        await asyncio.sleep(interval)
+        async with sessions_lock:
+            session_histories.expire()
+            prune_session_locks()
 
 
 @asynccontextmanager
@@ -99,15 +177,51 @@ async def lifespan(app: FastAPI):
     # Initialize global configuration
     global config
     config = build_config()
+    prompt_cache = create_prompt_cache(config)
     
     logger.info(f"📊 Configuration loaded for instance: {config['instance_name']}")
     logger.info(f"📁 Using CSV file: {config['csv_file_path']}")
     logger.info(f"🔍 Search depth: {config['search_depth']}")
     logger.info(f"📈 Max results: {config['max_results']}")
+    logger.info(
+        f"⚡ Prompt cache: {'enabled' if prompt_cache else 'disabled'}"
+    )
+
+    # HTML parsing runs in worker processes, 0 workers keeps it on a thread
+    parse_pool = None
+    if config["parse_workers"] > 0:
+        # Spawned, not forked: the parent already runs the event loop and threads
+        parse_pool = ProcessPoolExecutor(
+            max_workers=config["parse_workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        WebScrapingTool.parse_pool = parse_pool
+    app.state.parse_pool = parse_pool
+    logger.info(f"🧮 HTML parse workers: {config['parse_workers']}")
+
+    # Pooled HTTP/2 client reused by every outbound search request
+    http_client = create_http_client(config["request_timeout"])
+    app.state.http_client = http_client
+
+    # One agent serves every session; sessions only own their chat history
+    app.state.agent = DomainQAAgent(
+        csv_file_path=config["csv_file_path"],
+        config=config,
+        prompt_cache=prompt_cache,
+        http_client=http_client,
+    )
+    expire_task = asyncio.create_task(expire_sessions())
     
     yield
     
     logger.info("🛑 Shutting down QA Agent application...")
+    expire_task.cancel()
+    await WebScrapingTool.aclose_browser()
+    await app.state.agent.search_tool.aclose()
+    await http_client.aclose()
+    if parse_pool is not None:
+        WebScrapingTool.parse_pool = None
+        parse_pool.shutdown(cancel_futures=True)
 
 
 app = FastAPI(
@@ -115,8 +229,12 @@ app = FastAPI(
     description="A specialized Q&A agent that searches specific documentation websites",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# Compress larger responses (chat answers, session lists); health checks stay plain
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -128,6 +246,43 @@ class ChatResponse(BaseModel):
     session_id: str
 
 
+def resolve_session_id(session_id: str | None) -> str:
+    """Return the cookie session ID, generating one if not provided"""
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        logger.info(f"🆔 New session created: {session_id}")
+    return session_id
+
+
+async def get_session_history(
+    session_id: str, reset_memory: bool
+) -> List[BaseMessage]:
+    """Get or create the chat history of a session"""
+    async with sessions_lock:
+        if reset_memory:
+            session_histories.pop(session_id, None)
+            logger.info(f"🔄 Memory reset for session: {session_id}")
+
+        chat_history = session_histories.get(session_id)
+        if chat_history is None:
+            chat_history = []
+        # Re-inserting restarts the session TTL, like the refreshed cookie
+        session_histories[session_id] = chat_history
+
+    return chat_history
+
+
+def set_session_cookie(response: Response, session_id: str) -> None:
+    """Attach the session cookie to a response"""
+    response.set_cookie(
+        key="session_id",
+        value=session_id,
+        max_age=SESSION_TTL,
+        httponly=True,
+        secure=False,  # Set to True in production with HTTPS
+    )
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -136,58 +291,86 @@ async def health_check():
         "instance": config.get("instance_name", "qa-agent"),
         "csv_file": config.get("csv_file_path", "sites_data.csv"),
         "search_depth": config.get("search_depth", "basic"),
-        "active_sessions": len(agents),
+        "active_sessions": len(session_histories),
     }
 
 
-@app.post("/chat", response_model=ChatResponse)
+# ChatResponse only documents the schema, the response is serialized directly
+@app.post("/chat", response_model=None, responses={200: {"model": ChatResponse}})
 async def chat(request: ChatRequest, session_id: str = Cookie(None)):
-    """Chat endpoint with session management"""
+    """Chat endpoint with session management.
+
+    Returns {"response": str, "session_id": str} and sets the session cookie.
+    """
     try:
-        # Generate session ID if not provided
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            logger.info(f"🆔 New session created: {session_id}")
-
-        # Get or create agent for this session
-        if session_id not in agents or request.reset_memory:
-            logger.info(f"🤖 Creating new agent for session: {session_id}")
-            agents[session_id] = DomainQAAgent(
-                csv_file_path=config["csv_file_path"], config=config
-            )
-            if request.reset_memory:
-                logger.info(f"🔄 Memory reset for session: {session_id}")
+        session_id = resolve_session_id(session_id)
 
-        agent = agents[session_id]
-        logger.info(f"💬 Processing chat request for session: {session_id}")
+        async with session_turn(session_id):
+            chat_history = await get_session_history(
+                session_id, request.reset_memory
+            )
+            logger.info(f"💬 Processing chat request for session: {session_id}")
 
-        # Process the chat request
-        response = await agent.achat(request.message)
+            # Process the chat request
+            response = await app.state.agent.achat(request.message, chat_history)
         logger.info(f"✅ Chat response generated for session: {session_id}")
 
         # Create response with session cookie
-        chat_response = ChatResponse(response=response, session_id=session_id)
-        response_obj = Response(content=chat_response.model_dump_json())
-        response_obj.set_cookie(
-            key="session_id",
-            value=session_id,
-            max_age=3600,  # 1 hour
-            httponly=True,
-            secure=False,  # Set to True in production with HTTPS
+        response_obj = ORJSONResponse(
+            content={"response": response, "session_id": session_id}
         )
+        set_session_cookie(response_obj, session_id)
 
-        return chat_response
+        return response_obj
 
     except Exception as e:
         logger.error(f"❌ Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, session_id: str = Cookie(None)):
+    """Chat endpoint streaming agent events as Server-Sent Events.
+
+    Emits "token", "tool" and a final "answer" (or "error") event, each
+    with a JSON-encoded data field.
+    """
+    session_id = resolve_session_id(session_id)
+
+    async def event_stream():
+        async with session_turn(session_id):
+            chat_history = await get_session_history(
+                session_id, request.reset_memory
+            )
+            logger.info(f"💬 Streaming chat request for session: {session_id}")
+
+            async for event in app.state.agent.astream(request.message, chat_history):
+                data = orjson.dumps(event["data"]).decode()
+                yield f"event: {event['event']}\ndata: {data}\n\n"
+        logger.info(f"✅ Chat stream completed for session: {session_id}")
+
+    response_obj = StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # identity encoding keeps GZipMiddleware from buffering the event stream
+        headers={
+            "Cache-Control": "no-cache",
+            "Content-Encoding": "identity",
+            "X-Accel-Buffering": "no",
+        },
+    )
+    set_session_cookie(response_obj, session_id)
+
+    return response_obj
+
+
 @app.post("/reset")
 async def reset_memory(session_id: str = Cookie(None)):
     """Reset memory for a session"""
-    if session_id and session_id in agents:
-        del agents[session_id]
+    async with sessions_lock:
+        removed = session_id and session_histories.pop(session_id, None) is not None
+        prune_session_locks()
+    if removed:
         logger.info(f"🔄 Memory reset for session: {session_id}")
         return {"message": "Memory reset successfully"}
     else:
@@ -198,8 +381,8 @@ async def reset_memory(session_id: str = Cookie(None)):
 async def list_sessions():
     """List active sessions (for debugging)"""
     return {
-        "active_sessions": len(agents),
-        "session_ids": list(agents.keys()),
+        "active_sessions": len(session_histories),
+        "session_ids": list(session_histories.keys()),
         "instance": config.get("instance_name", "qa-agent"),
     }
 
@@ -209,6 +392,11 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        loop="uvloop",
+        http="httptools",
+        # Sessions live in process memory, so keep one worker unless a
+        # sticky load balancer sits in front of the instance
+        workers=get_int_env("UVICORN_WORKERS", 1),
+        reload=os.getenv("UVICORN_RELOAD", "false").lower() == "true",
         log_level="info",
     )
@@ -0,0 +1,130 @@
+"""
+Semantic prompt cache for skipping the agent on repeated questions
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def create_embeddings(openai_api_key: str) -> OpenAIEmbeddings:
+    """Create embedding model used for cache lookups"""
+    return OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        openai_api_key=openai_api_key,
+    )
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text for exact-match lookups"""
+    return " ".join(query.lower().split())
+
+
+class SemanticPromptCache:
+    """TTL-bounded cache of answers keyed by query embedding similarity"""
+
+    def __init__(
+        self,
+        embeddings: OpenAIEmbeddings,
+        max_entries: int = 512,
+        ttl: float = 3600,
+        similarity_threshold: float = 0.93,
+    ):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # normalized query -> (unit embedding, answer, expires_at)
+        self._entries: "OrderedDict[str, tuple[np.ndarray, str, float]]" = (
+            OrderedDict()
+        )
+        self._keys: list[str] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def _purge_expired(self, now: float) -> None:
+        """Drop expired entries and invalidate the similarity matrix"""
+        expired = [key for key, entry in self._entries.items() if entry[2] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _similarity_matrix(self) -> Optional[np.ndarray]:
+        """Stack cached embeddings into one matrix for a batched dot product"""
+        if self._matrix is None and self._entries:
+            self._keys = list(self._entries.keys())
+            self._matrix = np.vstack([entry[0] for entry in self._entries.values()])
+        return self._matrix
+
+    def _get_exact(self, key: str, now: float) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[2] <= now:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def alookup(self, query: str) -> tuple[Optional[str], Optional[np.ndarray]]:
+        """Return a cached answer (if any) and the query embedding for a later store"""
+        now = time.monotonic()
+        key = normalize_query(query)
+
+        # Exact-match fast path, no embedding call needed
+        cached = self._get_exact(key, now)
+        if cached is not None:
+            logger.info("⚡ Prompt cache exact hit")
+            return cached, None
+
+        vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+
+        self._purge_expired(now)
+        matrix = self._similarity_matrix()
+        if matrix is None:
+            return None, vector
+
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            logger.info(f"⚡ Prompt cache semantic hit (similarity={scores[best]:.3f})")
+            return self._get_exact(self._keys[best], now), vector
+
+        return None, vector
+
+    def store(self, query: str, vector: Optional[np.ndarray], answer: str) -> None:
+        """Cache an answer under the query and its embedding"""
+        if vector is None:
+            return
+
+        key = normalize_query(query)
+        self._entries[key] = (vector, answer, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self) -> None:
+        """Drop all cached answers"""
+        self._entries.clear()
+        self._matrix = None
+
+
+def create_prompt_cache(config: Dict[str, Any]) -> Optional[SemanticPromptCache]:
+    """Create prompt cache from configuration, or None if disabled"""
+    if not config.get("enable_prompt_cache", False):
+        return None
+
+    return SemanticPromptCache(
+        embeddings=create_embeddings(config["openai_api_key"]),
+        max_entries=config.get("prompt_cache_max_entries", 512),
+        ttl=config.get("prompt_cache_ttl", 3600),
+        similarity_threshold=config.get("prompt_cache_similarity", 0.93),
+    )
@@ -2,32 +2,89 @@
 Q&A Agent with domain-specific web search capabilities
 """
 
+import asyncio
+import csv
+import functools
 import logging
-import pandas as pd
-from typing import List, Dict, Any, Optional
+import re
+import httpx
+import tiktoken
+from typing import AsyncIterator, List, Dict, Any, Optional
 
 from langchain.agents import AgentExecutor, create_structured_chat_agent
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
+from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.callbacks import AsyncCallbackHandler
 
-from search_tool import TavilyDomainSearchTool
+from search_tool import SUMMARIZER_TAG, TavilyDomainSearchTool
 from scraping_tool import WebScrapingTool
+from prompt_cache import SemanticPromptCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tokenizer for the agent model, used to budget chat history
+_encoding = tiktoken.encoding_for_model("gpt-4o-mini")
 
-def load_sites_data(csv_file_path: str) -> pd.DataFrame:
+_URL_PATTERN = re.compile(r"https?://[^\s)\]>\"'`]+")
+
+# Output AgentExecutor returns when max_iterations or max_execution_time hits
+_EARLY_STOP_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+
+def _is_complete_answer(response: Dict[str, Any]) -> bool:
+    """Whether the agent reached a final answer without stopping early or misparsing"""
+    if response.get("output") in (None, _EARLY_STOP_OUTPUT):
+        return False
+    # handle_parsing_errors records unparseable LLM output as an _Exception step
+    return all(
+        getattr(action, "tool", None) != "_Exception"
+        for action, _ in response.get("intermediate_steps", [])
+    )
+
+
+def _trim_history(
+    history: List[BaseMessage], budget: int = 2000
+) -> List[BaseMessage]:
+    """Return the most recent messages that fit within a token budget.
+
+    The latest exchange is always kept, truncated if it alone exceeds the
+    budget, so follow-ups like "elaborate on that" keep their context.
+    """
+    used = 0
+    start = len(history)
+    for message in reversed(history):
+        used += len(_encoding.encode(str(message.content)))
+        if used > budget:
+            break
+        start -= 1
+
+    if start <= len(history) - 2:
+        return history[start:]
+    return [_truncate_message(message, budget // 2) for message in history[-2:]]
+
+
+def _truncate_message(message: BaseMessage, max_tokens: int) -> BaseMessage:
+    """Cut a message down to max_tokens, keeping its start"""
+    tokens = _encoding.encode(str(message.content))
+    if len(tokens) <= max_tokens:
+        return message
+    return type(message)(content=_encoding.decode(tokens[:max_tokens]) + "...")
+
+
+def load_sites_data(csv_file_path: str) -> List[Dict[str, str]]:
     """Load and validate sites data from CSV"""
-    df = pd.read_csv(csv_file_path)
-    required_columns = ["site", "domain", "description"]
-    missing_columns = [col for col in required_columns if col not in df.columns]
+    with open(csv_file_path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.DictReader(csv_file)
+        columns = reader.fieldnames or []
+        required_columns = ["site", "domain", "description"]
+        missing_columns = [col for col in required_columns if col not in columns]
 
-    if missing_columns:
-        raise ValueError(f"Missing required columns: {missing_columns}")
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
 
-    return df
+        return list(reader)
 
 
 def create_llm(config: Dict[str, Any]) -> ChatOpenAI:
@@ -41,7 +98,9 @@ def create_llm(config: Dict[str, Any]) -> ChatOpenAI:
     )
 
 
-def create_search_tool(config: Dict[str, Any]) -> TavilyDomainSearchTool:
+def create_search_tool(
+    config: Dict[str, Any], http_client: Optional[httpx.AsyncClient] = None
+) -> TavilyDomainSearchTool:
     """Create configured search tool"""
     return TavilyDomainSearchTool(
         api_key=config["tavily_api_key"],
@@ -54,20 +113,50 @@ def create_search_tool(config: Dict[str, Any]) -> TavilyDomainSearchTool:
             if config.get("enable_search_summarization", False)
             else None
         ),
+        http_client=http_client,
+        cache_max_entries=config.get("search_cache_max_entries", 512),
+        cache_ttl=config.get("search_cache_ttl", 900),
+        request_timeout=config["request_timeout"],
+        return_mode=config.get("search_return_mode", "summary"),
+        search_token_budget=config.get("search_token_budget", 24000),
     )
 
 
 def create_scraping_tool(config: Dict[str, Any]) -> WebScrapingTool:
     """Create configured web scraping tool"""
-    return WebScrapingTool(max_content_length=config["max_scrape_length"])
+    return WebScrapingTool(
+        max_content_length=config["max_scrape_length"],
+        navigation_timeout=config["request_timeout"],
+        cache_max_entries=config.get("scrape_cache_max_entries", 256),
+        cache_ttl=config.get("scrape_cache_ttl", 900),
+    )
 
 
-def build_knowledge_sources_text(sites_df: pd.DataFrame) -> tuple[str, List[str]]:
+@functools.lru_cache(maxsize=1)
+def _build_tools(
+    config_items: tuple[tuple[str, Any], ...],
+    http_client: Optional[httpx.AsyncClient],
+) -> tuple[TavilyDomainSearchTool, WebScrapingTool]:
+    """Build tools once per configuration, they hold no per-session state"""
+    config = dict(config_items)
+    return create_search_tool(config, http_client), create_scraping_tool(config)
+
+
+def _get_tools(
+    config: Dict[str, Any], http_client: Optional[httpx.AsyncClient] = None
+) -> tuple[TavilyDomainSearchTool, WebScrapingTool]:
+    """Get cached search and scraping tools for the given configuration"""
+    return _build_tools(tuple(sorted(config.items())), http_client)
+
+
+def build_knowledge_sources_text(
+    sites: List[Dict[str, str]],
+) -> tuple[str, List[str]]:
     """Build formatted knowledge sources text and domain list"""
     domain_groups = {}
     domains = []
 
-    for _, row in sites_df.iterrows():
+    for row in sites:
         domain = row["domain"]
         if domain not in domain_groups:
             domains.append(domain)
@@ -87,7 +176,7 @@ def build_knowledge_sources_text(sites_df: pd.DataFrame) -> tuple[str, List[str]
 
 
 def create_system_prompt(knowledge_sources_md: str, domains: List[str]) -> str:
-    """Create the system prompt with knowledge sources"""
+    """Create the static system prompt with knowledge sources (no template variables)"""
     return f"""You are a specialized Q&A agent that searches specific documentation websites.
 
 AVAILABLE KNOWLEDGE SOURCES split by category/domain/topic having the website and description for each category:
@@ -111,21 +200,31 @@ RULES:
 - Cite sources when possible
 - Only use scraping when search results provide no answer
 - When scraping, choose the most relevant URL from previous search results
+"""
+
 
-You have access to the following tools:
+@functools.lru_cache(maxsize=4)
+def _build_prompt_cached(csv_file_path: str) -> tuple[str, List[str], int]:
+    """Build system prompt, domain list and site count once per CSV file"""
+    sites = load_sites_data(csv_file_path)
+    knowledge_sources_md, domains = build_knowledge_sources_text(sites)
+    return create_system_prompt(knowledge_sources_md, domains), domains, len(sites)
 
-{{tools}}
+
+TOOL_INSTRUCTIONS_PROMPT = """You have access to the following tools:
+
+{tools}
 
 Use a json blob to specify a tool by providing an action key (tool name) and an action_input key (tool input).
 
-Valid "action" values: "Final Answer" or {{tool_names}}
+Valid "action" values: "Final Answer" or {tool_names}
 
 Provide only ONE action per JSON_BLOB, as shown:
 ```
-{{{{
+{{
   "action": "TOOL_NAME",
   "action_input": "INPUT"
-}}}}
+}}
 ```
 
 Follow this format:
@@ -141,15 +240,47 @@ Observation: action result
 Thought: I know what to respond
 Action: 
 ```
-{{{{
+{{
   "action": "Final Answer",
   "action_input": "response"
-}}}}
+}}
 ```
 Begin! Reminder to ALWAYS respond with a valid json blob of a single action. Use tools if necessary. Respond directly if appropriate and ask for clarification if something is not clear. Format is Action:```JSON_BLOB```then Observation
 """
 
 
+class SpeculativeScrapeHandler(AsyncCallbackHandler):
+    """Prefetch top search result pages while the LLM decides whether to scrape.
+
+    Prefetches go through the scraping tool's cache and per-page lock, so a
+    later scrape_website call for the same page waits for (or reuses) the
+    prefetched result instead of loading it again.
+    """
+
+    def __init__(self, scraping_tool: WebScrapingTool, max_urls: int = 2):
+        self.scraping_tool = scraping_tool
+        self.max_urls = max_urls
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    async def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        if kwargs.get("name") != "search_documentation":
+            return
+
+        urls = list(dict.fromkeys(_URL_PATTERN.findall(str(output))))
+        for url in urls[: self.max_urls]:
+            if url not in self.tasks:
+                logger.info(f"🔮 Prefetching: {url}")
+                self.tasks[url] = asyncio.create_task(
+                    self.scraping_tool.aprefetch(url)
+                )
+
+    def cancel_pending(self) -> None:
+        """Cancel prefetches that are still running"""
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+
+
 class DomainQAAgent:
     """Q&A Agent that searches specific domains based on user queries"""
 
@@ -157,29 +288,38 @@ class DomainQAAgent:
         self,
         csv_file_path: str = "sites_data.csv",
         config: Optional[Dict[str, Any]] = None,
+        prompt_cache: Optional[SemanticPromptCache] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
     ):
         if config is None:
             raise ValueError("Configuration is required")
 
         self.config = config
-        # Load sites data from CSV, this can be moved to main.py or a separate config module
-        self.sites_df = load_sites_data(csv_file_path)
+        self.prompt_cache = prompt_cache
+        # Prompt text depends only on the CSV, so it is built once per file
+        system_message, self.domains, site_count = _build_prompt_cached(
+            csv_file_path
+        )
         self.llm = create_llm(config)
-        search_tool = create_search_tool(config)
-        scraping_tool = create_scraping_tool(config)
-        self.chat_history: List[BaseMessage] = []
-        self.agent_executor = self._create_agent(search_tool, scraping_tool)
+        search_tool, scraping_tool = _get_tools(config, http_client)
+        self.scraping_tool = scraping_tool
+        self.agent_executor = self._create_agent(
+            system_message, search_tool, scraping_tool
+        )
 
-        logger.info(f"Agent initialized with {len(self.sites_df)} sites")
+        logger.info(f"Agent initialized with {site_count} sites")
 
-    def _create_agent(self, search_tool, scraping_tool) -> AgentExecutor:
+    def _create_agent(
+        self, system_message: str, search_tool, scraping_tool
+    ) -> AgentExecutor:
         """Create structured chat agent with tools and prompt"""
-        knowledge_sources_md, domains = build_knowledge_sources_text(self.sites_df)
-        system_message = create_system_prompt(knowledge_sources_md, domains)
 
+        # Static prefix first (literal message, no templating), then tool
+        # instructions, then the parts that change between requests
         prompt = ChatPromptTemplate.from_messages(
             [
-                ("system", system_message),
+                SystemMessage(content=system_message),
+                ("system", TOOL_INSTRUCTIONS_PROMPT),
                 MessagesPlaceholder(variable_name="chat_history", optional=True),
                 (
                     "human",
@@ -202,24 +342,69 @@ class DomainQAAgent:
             handle_parsing_errors=True, # Handle parsing errors gracefully
         )
 
-    async def achat(self, user_input: str) -> str:
-        """Process user input asynchronously"""
+    async def _lookup_cache(
+        self, user_input: str, chat_history: List[BaseMessage]
+    ) -> tuple[bool, Optional[str], Any]:
+        """Look up a cached answer, returning (cacheable, answer, query vector)"""
+        # Only first turns are cached, follow-ups depend on the conversation
+        if self.prompt_cache is None or chat_history:
+            return False, None, None
+        try:
+            cached, query_vector = await self.prompt_cache.alookup(user_input)
+            return True, cached, query_vector
+        except Exception as e:
+            logger.warning(f"Prompt cache lookup failed: {e}")
+            return False, None, None
+
+    def _build_agent_input(
+        self, user_input: str, chat_history: List[BaseMessage]
+    ) -> Dict[str, Any]:
+        """Build executor input from the user turn and recent history"""
+        return {
+            "input": user_input,
+            "chat_history": _trim_history(
+                chat_history, self.config.get("history_token_budget", 2000)
+            ),
+        }
+
+    def _create_run_config(self) -> tuple[Dict[str, Any], Optional[SpeculativeScrapeHandler]]:
+        """Create per-request executor config with speculative scraping if enabled"""
+        max_urls = self.config.get("speculative_scrape_urls", 2)
+        if max_urls <= 0:
+            return {}, None
+        handler = SpeculativeScrapeHandler(self.scraping_tool, max_urls)
+        return {"callbacks": [handler]}, handler
+
+    async def achat(self, user_input: str, chat_history: List[BaseMessage]) -> str:
+        """Process user input asynchronously, appending the turn to chat_history"""
         try:
             logger.info(f"Processing: {user_input}")
 
-            agent_input = {
-                "input": user_input,
-                "chat_history": (
-                    self.chat_history[-5:] if self.chat_history else []
-                ),  # limit context window to 5, this can be adjusted
-            }
+            use_cache, cached, query_vector = await self._lookup_cache(
+                user_input, chat_history
+            )
+            if cached is not None:
+                chat_history.extend(
+                    [HumanMessage(content=user_input), AIMessage(content=cached)]
+                )
+                return cached
+
+            agent_input = self._build_agent_input(user_input, chat_history)
+            run_config, prefetcher = self._create_run_config()
 
             # Async invoke the agent executor
-            response = await self.agent_executor.ainvoke(agent_input)
+            try:
+                response = await self.agent_executor.ainvoke(agent_input, run_config)
+            finally:
+                if prefetcher:
+                    prefetcher.cancel_pending()
             answer = response.get("output", "I couldn't process your request.")
 
+            if use_cache and _is_complete_answer(response):
+                self.prompt_cache.store(user_input, query_vector, answer)
+
             # Update chat history
-            self.chat_history.extend(
+            chat_history.extend(
                 [HumanMessage(content=user_input), AIMessage(content=answer)]
             )
 
@@ -230,7 +415,64 @@ class DomainQAAgent:
             logger.error(error_msg)
             return error_msg
 
-    def reset_memory(self):
-        """Reset conversation memory"""
-        self.chat_history.clear()
-        logger.info("Memory reset")
+    async def astream(
+        self, user_input: str, chat_history: List[BaseMessage]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream agent events as they happen, appending the turn to chat_history.
+
+        Yields dicts with an "event" key: "token" for LLM output chunks
+        (including the agent's tool-selection JSON), "tool" when a tool
+        starts, and a final "answer" with the complete response.
+        """
+        try:
+            logger.info(f"Streaming: {user_input}")
+
+            use_cache, cached, query_vector = await self._lookup_cache(
+                user_input, chat_history
+            )
+            if cached is not None:
+                chat_history.extend(
+                    [HumanMessage(content=user_input), AIMessage(content=cached)]
+                )
+                yield {"event": "answer", "data": cached}
+                return
+
+            agent_input = self._build_agent_input(user_input, chat_history)
+            run_config, prefetcher = self._create_run_config()
+            response: Dict[str, Any] = {}
+
+            try:
+                async for event in self.agent_executor.astream_events(
+                    agent_input, run_config, version="v2"
+                ):
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream":
+                        # Summarizer output is tool-internal, not agent output
+                        if SUMMARIZER_TAG in event.get("tags", []):
+                            continue
+                        content = event["data"]["chunk"].content
+                        if content:
+                            yield {"event": "token", "data": content}
+                    elif kind == "on_tool_start":
+                        yield {"event": "tool", "data": event["name"]}
+                    elif kind == "on_chain_end" and not event["parent_ids"]:
+                        response = event["data"].get("output") or {}
+            finally:
+                if prefetcher:
+                    prefetcher.cancel_pending()
+
+            answer = response.get("output", "I couldn't process your request.")
+
+            if use_cache and _is_complete_answer(response):
+                self.prompt_cache.store(user_input, query_vector, answer)
+
+            chat_history.extend(
+                [HumanMessage(content=user_input), AIMessage(content=answer)]
+            )
+
+            yield {"event": "answer", "data": answer}
+
+        except Exception as e:
+            error_msg = f"Error: {str(e)}"
+            logger.error(error_msg)
+            yield {"event": "error", "data": error_msg}
@@ -4,12 +4,14 @@ Web scraping tool using Chromium for dynamic content extraction
 
 import logging
 import asyncio
-from typing import List, Type
+from concurrent.futures import Executor
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Sequence, Tuple, Type
 
+from cachetools import TTLCache
 from pydantic import BaseModel, Field, ConfigDict
 from langchain.tools import BaseTool
-from langchain_community.document_loaders import AsyncChromiumLoader
-from langchain_community.document_transformers import BeautifulSoupTransformer
+
+from tool_utils import ensure_no_running_loop
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,6 +22,45 @@ def get_default_tags() -> List[str]:
     return ["p", "li", "div", "a", "span", "h1", "h2", "h3", "h4", "h5", "h6"]
 
 
+def _node_strings(node: Any) -> Iterator[str]:
+    """Yield the text pieces under a node, links keep their href"""
+    for child in node.traverse(include_text=True):
+        if child.tag != "-text":
+            continue
+        text = child.text(deep=False).strip()
+        if not text:
+            continue
+        parent = child.parent
+        href = parent.attributes.get("href") if parent.tag == "a" else None
+        yield f"{text} ({href})" if href else text
+
+
+def extract_tag_text(html: str, tags_to_extract: Sequence[str]) -> str:
+    """Extract text of the given tags in document order, links keep their href"""
+    # Imported lazily so only processes that actually scrape load the parser
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(["script", "style", "noscript"])
+
+    parts = []
+    emitted = set()
+    for node in tree.css(", ".join(tags_to_extract)):
+        # Nested matches are already part of their emitted ancestor's text
+        ancestor = node.parent
+        while ancestor is not None and ancestor.mem_id not in emitted:
+            ancestor = ancestor.parent
+        if ancestor is not None:
+            continue
+        emitted.add(node.mem_id)
+
+        text = " ".join(_node_strings(node))
+        if text:
+            parts.append(text)
+
+    return "\n".join(parts)
+
+
 class WebScrapingInput(BaseModel):
     url: str = Field(description="URL to scrape")
     tags_to_extract: List[str] = Field(
@@ -66,56 +107,109 @@ class WebScrapingTool(BaseTool):
     args_schema: Type[BaseModel] = WebScrapingInput
 
     max_content_length: int = Field(default=20000, exclude=True)
+    navigation_timeout: int = Field(default=30, exclude=True)
+    scrape_cache: Any = Field(default=None, exclude=True)
+    scrape_locks: Dict[Tuple[str, Tuple[str, ...]], asyncio.Lock] = Field(
+        default_factory=dict, exclude=True
+    )
+    scrape_lock_waiters: Dict[Tuple[str, Tuple[str, ...]], int] = Field(
+        default_factory=dict, exclude=True
+    )
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
-    def __init__(self, max_content_length: int = 20000):
+    # One Chromium process shared by every scrape, launched on first use
+    _playwright: ClassVar[Any] = None
+    _browser: ClassVar[Any] = None
+    _browser_loop: ClassVar[Optional[asyncio.AbstractEventLoop]] = None
+    _browser_lock: ClassVar[Optional[asyncio.Lock]] = None
+
+    # Process pool for HTML parsing, set by the application at startup
+    parse_pool: ClassVar[Optional[Executor]] = None
+
+    def __init__(
+        self,
+        max_content_length: int = 20000,
+        navigation_timeout: int = 30,
+        cache_max_entries: int = 256,
+        cache_ttl: int = 900,
+    ):
         super().__init__(
-            max_content_length=max_content_length, args_schema=WebScrapingInput
+            max_content_length=max_content_length,
+            navigation_timeout=navigation_timeout,
+            args_schema=WebScrapingInput,
         )
 
-    async def _process_scraping(
-        self, url: str, tags_to_extract: List[str] = None, is_async: bool = True
-    ) -> str:
-        """Common logic for both sync and async scraping"""
-        try:
-            if tags_to_extract is None:
-                tags_to_extract = get_default_tags()
-
-            loader = AsyncChromiumLoader([url])
-
-            if is_async:
-                html_docs = await asyncio.to_thread(loader.load)
-            else:
-                html_docs = loader.load()
-
-            if not html_docs:
-                return f"Failed to load content from {url}"
-
-            bs_transformer = BeautifulSoupTransformer()
-
-            if is_async:
-                docs_transformed = await asyncio.to_thread(
-                    bs_transformer.transform_documents,
-                    html_docs,
-                    tags_to_extract=tags_to_extract,
-                )
-            else:
-                docs_transformed = bs_transformer.transform_documents(
-                    html_docs,
-                    tags_to_extract=tags_to_extract,
-                )
-
-            if not docs_transformed:
-                return f"No content extracted from {url}"
-
-            content = docs_transformed[0].page_content
-
-            if len(content) > self.max_content_length:
-                content = (
-                    content[: self.max_content_length] + "\n\n... (content truncated)"
-                )
+        object.__setattr__(
+            self, "scrape_cache", TTLCache(maxsize=cache_max_entries, ttl=cache_ttl)
+        )
 
-            return f"""
+    @classmethod
+    async def _get_browser(cls) -> Any:
+        """Get the shared browser, launching it if needed"""
+        loop = asyncio.get_running_loop()
+        if cls._browser_loop is not loop:
+            # Playwright objects are bound to the loop that created them
+            cls._playwright = cls._browser = None
+            cls._browser_lock = asyncio.Lock()
+            cls._browser_loop = loop
+
+        async with cls._browser_lock:
+            if cls._browser is None or not cls._browser.is_connected():
+                if cls._playwright is None:
+                    # Playwright is heavy, load it on the first scrape only
+                    from playwright.async_api import async_playwright
+
+                    cls._playwright = await async_playwright().start()
+                cls._browser = await cls._playwright.chromium.launch(headless=True)
+                logger.info("🌐 Chromium browser launched")
+            return cls._browser
+
+    @classmethod
+    async def aclose_browser(cls) -> None:
+        """Close the shared browser and Playwright driver"""
+        if cls._browser_loop is not asyncio.get_running_loop():
+            return
+        if cls._browser is not None:
+            await cls._browser.close()
+            logger.info("🌐 Chromium browser closed")
+        if cls._playwright is not None:
+            await cls._playwright.stop()
+        cls._playwright = cls._browser = None
+
+    async def _load_html(self, url: str) -> str:
+        """Render a page in a new tab of the shared browser"""
+        browser = await self._get_browser()
+        page = await browser.new_page()
+        try:
+            await page.goto(url, timeout=self.navigation_timeout * 1000)
+            return await page.content()
+        finally:
+            await page.close()
+
+    async def _scrape(self, url: str, tags_to_extract: List[str]) -> Tuple[bool, str]:
+        """Load and extract a page, returning (success, formatted text)"""
+        html = await self._load_html(url)
+
+        if not html:
+            return False, f"Failed to load content from {url}"
+
+        # Parsing is CPU-bound, run it in the process pool so it scales past the GIL
+        if self.parse_pool is not None:
+            content = await asyncio.get_running_loop().run_in_executor(
+                self.parse_pool, extract_tag_text, html, tuple(tags_to_extract)
+            )
+        else:
+            content = await asyncio.to_thread(extract_tag_text, html, tags_to_extract)
+
+        if not content:
+            return False, f"No content extracted from {url}"
+
+        if len(content) > self.max_content_length:
+            content = (
+                content[: self.max_content_length] + "\n\n... (content truncated)"
+            )
+
+        return True, f"""
 **Website Scraped:** {url}
 **Content Extracted:**
 
@@ -124,15 +218,59 @@ class WebScrapingTool(BaseTool):
 **Note:** Complete website content for comprehensive analysis.
 """
 
+    async def _process_scraping(self, url: str, tags_to_extract: List[str] = None) -> str:
+        """Scrape a page through the result cache"""
+        if tags_to_extract is None:
+            tags_to_extract = get_default_tags()
+
+        key = (url, tuple(sorted(tags_to_extract)))
+        cached = self.scrape_cache.get(key)
+        if cached is not None:
+            logger.info(f"⚡ Scrape cache hit: {url}")
+            return cached
+
+        # Concurrent scrapes of the same page wait for the first one
+        lock = self.scrape_locks.setdefault(key, asyncio.Lock())
+        self.scrape_lock_waiters[key] = self.scrape_lock_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                cached = self.scrape_cache.get(key)
+                if cached is not None:
+                    return cached
+
+                success, result = await self._scrape(url, tags_to_extract)
+                if success:
+                    self.scrape_cache[key] = result
+                return result
+
         except Exception as e:
             return f"Web scraping error for {url}: {str(e)}"
+        finally:
+            # Counted rather than lock.locked(), which is briefly False while
+            # the lock is handed to the next waiter
+            remaining = self.scrape_lock_waiters.pop(key) - 1
+            if remaining:
+                self.scrape_lock_waiters[key] = remaining
+            else:
+                del self.scrape_locks[key]
+
+    async def aprefetch(self, url: str) -> None:
+        """Scrape a page with default tags into the cache ahead of a likely request"""
+        await self._process_scraping(url)
 
     def _run(self, url: str, tags_to_extract: List[str] = None) -> str:
         """Scrape website content"""
-        return asyncio.run(
-            self._process_scraping(url, tags_to_extract, is_async=False)
-        )
+        ensure_no_running_loop(self.name)
+
+        async def scrape_once() -> str:
+            # The event loop dies with asyncio.run, so the browser goes too
+            try:
+                return await self._arun(url, tags_to_extract)
+            finally:
+                await self.aclose_browser()
+
+        return asyncio.run(scrape_once())
 
     async def _arun(self, url: str, tags_to_extract: List[str] = None) -> str:
         """Async version of scraping"""
-        return await self._process_scraping(url, tags_to_extract, is_async=True)
+        return await self._process_scraping(url, tags_to_extract)
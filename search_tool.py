@@ -2,63 +2,170 @@
 Tavily search tool for domain-specific web search
 """
 
+import functools
+import hashlib
+import json
 import logging
-from typing import List, Optional, Type, Any
+from typing import AsyncIterator, Dict, List, Literal, Optional, Type, Any
 import asyncio
 
-from pydantic import BaseModel, Field, ConfigDict
+import httpx
+import orjson
+import tiktoken
+from cachetools import TTLCache
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 from langchain.tools import BaseTool
 from langchain_openai import ChatOpenAI
-from tavily import TavilyClient
+
+from tool_utils import ensure_no_running_loop
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+
+# Run tag on summarizer calls, so agent event streams can tell them apart
+SUMMARIZER_TAG = "search_summarizer"
+
+_encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+
 
-def create_summarizer_llm(openai_api_key: str) -> ChatOpenAI:
-    """Create summarization LLM"""
+def create_http_client(timeout: float = 30) -> httpx.AsyncClient:
+    """Create pooled HTTP/2 client for Tavily requests"""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=timeout,
+    )
+
+
+def create_summarizer_llm(
+    openai_api_key: str, http_async_client: Optional[httpx.AsyncClient] = None
+) -> ChatOpenAI:
+    """Create summarization LLM, optionally on a shared pooled HTTP client"""
     return ChatOpenAI(
         model="gpt-4o-mini",
         temperature=0.1,
         max_tokens=1000,
         openai_api_key=openai_api_key,
+        http_async_client=http_async_client,
     )
 
 
-def format_search_results(results: List[dict], max_content_size: int) -> List[str]:
-    """Format search results into readable strings"""
-    formatted_results = []
-    for i, result in enumerate(results, 1):
-        title = result.get("title", "No title")
-        url = result.get("url", "No URL")
-        content = result.get("content", "No content available")
+@functools.lru_cache(maxsize=4)
+def get_summarizer_llm(
+    openai_api_key: str, http_async_client: Optional[httpx.AsyncClient] = None
+) -> ChatOpenAI:
+    """Get a summarization LLM shared by tool instances with the same key and client"""
+    return create_summarizer_llm(openai_api_key, http_async_client)
+
 
-        logger.info(f"📄 Processing result {i}: {title[:50]}...")
+def _format_result(
+    i: int, result: dict, max_content_size: int, max_tokens: Optional[int] = None
+) -> str:
+    """Format one search result into a readable block"""
+    title = result.get("title", "No title")
+    url = result.get("url", "No URL")
+    # Popped so the full content is freed once the truncated copy exists
+    content = result.pop("content", "No content available")
 
-        if len(content) > max_content_size:
-            content = content[:max_content_size] + "..."
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("📄 Processing result %d: %.50s...", i, title)
 
-        formatted_result = f"""
+    if len(content) > max_content_size:
+        content = content[:max_content_size] + "..."
+
+    # A token spans at least one character, so shorter content needs no encoding
+    if max_tokens is not None and len(content) > max_tokens:
+        tokens = _encoding.encode(content)
+        if len(tokens) > max_tokens:
+            content = _encoding.decode(tokens[:max_tokens]) + "..."
+
+    return f"""
 Result {i}:
 Title: {title}
 URL: {url}
 Content: {content}
 ---
 """
-        formatted_results.append(formatted_result)
 
-    return formatted_results
 
+def format_search_results(
+    results: List[dict], max_content_size: int, max_tokens: Optional[int] = None
+) -> str:
+    """Format search results into one readable string"""
+    # String work only: a JIT (numba) has nothing to compile here, keep it pure Python
+    return "\n".join(
+        _format_result(i, result, max_content_size, max_tokens)
+        for i, result in enumerate(results, 1)
+    )
 
-def create_summary_prompt(search_results: str, original_query: str) -> str:
-    """Create prompt for result summarization"""
-    return f"""
+
+SIMHASH_SHINGLE_SIZE = 5
+SIMHASH_MAX_DISTANCE = 3
+
+
+def simhash64(text: str) -> int:
+    """64-bit SimHash over word 5-gram shingles"""
+    words = text.lower().split()
+    shingles = {
+        " ".join(words[i : i + SIMHASH_SHINGLE_SIZE])
+        for i in range(max(len(words) - SIMHASH_SHINGLE_SIZE + 1, 1))
+    }
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _dedup_results(results: List[dict], max_content_size: int) -> List[dict]:
+    """Drop results whose content is a near-duplicate of an earlier one"""
+    kept: List[dict] = []
+    kept_hashes: List[int] = []
+    for result in results:
+        # Only the part that survives formatting matters for duplicates
+        fingerprint = simhash64((result.get("content") or "")[:max_content_size])
+        if any(
+            (fingerprint ^ other).bit_count() <= SIMHASH_MAX_DISTANCE
+            for other in kept_hashes
+        ):
+            continue
+        kept.append(result)
+        kept_hashes.append(fingerprint)
+    return kept
+
+
+def make_search_cache_key(
+    query: str, sites: List[str], max_results: int, depth: str
+) -> str:
+    """Build a stable cache key from normalized search arguments"""
+    payload = json.dumps(
+        {
+            "query": query,
+            "sites": sorted(sites),
+            "max_results": max_results,
+            "depth": depth,
+        },
+        sort_keys=True,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+_PROMPT_HEAD = """
 You are a technical documentation summarizer. Your job is to extract and summarize only the most relevant information from search results.
 
-Original User Query: "{original_query}"
+Original User Query: \""""
+
+_PROMPT_MID = """"
 
 Search Results to Summarize:
-{search_results}
+"""
+
+_PROMPT_TAIL = """
 
 Instructions:
 1. Focus ONLY on information directly relevant to answering the user's query
@@ -72,6 +179,11 @@ Relevant Summary:
 """
 
 
+def create_summary_prompt(search_results: str, original_query: str) -> str:
+    """Create prompt for result summarization"""
+    return f"{_PROMPT_HEAD}{original_query}{_PROMPT_MID}{search_results}{_PROMPT_TAIL}"
+
+
 class TavilySearchInput(BaseModel):
     query: str = Field(description="Search query with relevant keywords")
     sites: List[str] = Field(
@@ -84,6 +196,25 @@ class TavilySearchInput(BaseModel):
         default=None, description="Search depth: 'basic' or 'advanced'"
     )
 
+    @field_validator("query")
+    @classmethod
+    def normalize_query(cls, v: str) -> str:
+        """Collapse whitespace so equivalent queries share a cache key"""
+        query = " ".join(v.split())
+        if not query:
+            raise ValueError("query must not be empty")
+        return query
+
+    @field_validator("sites")
+    @classmethod
+    def normalize_sites(cls, v: List[str]) -> List[str]:
+        """Lowercase, strip and deduplicate domains, keeping their order"""
+        sites = list(dict.fromkeys(s.strip().lower() for s in v if s and s.strip()))
+        # An empty include_domains would make Tavily search the whole web
+        if not sites:
+            raise ValueError("sites must contain at least one domain")
+        return sites
+
 
 class TavilyDomainSearchTool(BaseTool):
     """Search specific domains using Tavily"""
@@ -117,13 +248,29 @@ class TavilyDomainSearchTool(BaseTool):
     """
     args_schema: Type[BaseModel] = TavilySearchInput
 
-    tavily_client: Any = Field(default=None, exclude=True)
+    http_client: Any = Field(default=None, exclude=True)
+    owned_client: Any = Field(default=None, exclude=True)
+    owned_client_loop: Any = Field(default=None, exclude=True)
+    request_timeout: float = Field(default=30, exclude=True)
     api_key: str = Field(exclude=True)
     default_max_results: int = Field(default=10, exclude=True)
     default_depth: str = Field(default="basic", exclude=True)
     max_content_size: int = Field(default=10000, exclude=True)
+    search_token_budget: int = Field(default=24000, exclude=True)
     enable_summarization: bool = Field(default=False, exclude=True)
     summarizer_llm: Any = Field(default=None, exclude=True)
+    result_cache: Any = Field(default=None, exclude=True)
+    request_headers: Dict[str, str] = Field(default_factory=dict, exclude=True)
+    return_mode: Literal["raw", "summary", "both"] = Field(
+        default="summary", exclude=True
+    )
+    background_summaries: Dict[str, asyncio.Task] = Field(
+        default_factory=dict, exclude=True
+    )
+    inflight: Dict[str, asyncio.Task] = Field(default_factory=dict, exclude=True)
+    inflight_waiters: Dict[asyncio.Task, int] = Field(
+        default_factory=dict, exclude=True
+    )
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -135,12 +282,21 @@ class TavilyDomainSearchTool(BaseTool):
         max_content_size: int = 10000,
         enable_summarization: bool = False,
         openai_api_key: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        cache_max_entries: int = 512,
+        cache_ttl: int = 900,
+        request_timeout: float = 30,
+        return_mode: Literal["raw", "summary", "both"] = "summary",
+        search_token_budget: int = 24000,
     ):
         super().__init__(
             api_key=api_key,
+            request_timeout=request_timeout,
+            return_mode=return_mode,
             default_max_results=max_results,
             default_depth=depth,
             max_content_size=max_content_size,
+            search_token_budget=search_token_budget,
             enable_summarization=enable_summarization,
             args_schema=TavilySearchInput,
         )
@@ -148,10 +304,24 @@ class TavilyDomainSearchTool(BaseTool):
         if not api_key:
             raise ValueError("TAVILY_API_KEY is required")
 
-        object.__setattr__(self, "tavily_client", TavilyClient(api_key=api_key))
+        # Shared pooled client from the application, or one owned by the tool
+        object.__setattr__(self, "http_client", http_client)
+        # Static request headers, built once instead of per search
+        object.__setattr__(
+            self,
+            "request_headers",
+            {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+        )
+        # Formatted (and summarized) results keyed by normalized search arguments
+        object.__setattr__(
+            self, "result_cache", TTLCache(maxsize=cache_max_entries, ttl=cache_ttl)
+        )
 
         if enable_summarization and openai_api_key:
-            summarizer = create_summarizer_llm(openai_api_key)
+            summarizer = get_summarizer_llm(openai_api_key, http_client)
             object.__setattr__(self, "summarizer_llm", summarizer)
             logger.info("🧠 Search result summarization enabled with GPT-4o-mini")
         elif enable_summarization:
@@ -164,81 +334,261 @@ class TavilyDomainSearchTool(BaseTool):
 
     async def _search_async(self, query: str, sites: List[str], max_results: int = None, depth: str = None) -> str:
         """Execute search with given parameters asynchronously"""
-        try:
-            final_max_results = max_results or self.default_max_results
-            final_depth = depth or self.default_depth
+        # The LLM may pass zero or a negative count, always ask for at least one
+        final_max_results = max(max_results or self.default_max_results, 1)
+        final_depth = depth or self.default_depth
+        cache_key = make_search_cache_key(
+            query, sites, final_max_results, final_depth
+        )
 
-            logger.info(f"🔍 Searching: '{query}' on sites: {sites}")
-            logger.info(
-                f"📊 Parameters: max_results={final_max_results}, depth={final_depth}"
+        # Concurrent identical searches share one in-flight task. No await
+        # happens between the lookup and the insert, so no lock is needed.
+        task = self.inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(
+                self._search_uncoalesced(
+                    query, sites, final_max_results, final_depth, cache_key
+                )
             )
-
-            # Note: TavilyClient doesn't have async methods yet, so we run in thread
-            search_results = await asyncio.to_thread(
-                self.tavily_client.search,
-                query=query,
-                max_results=final_max_results,
-                search_depth=final_depth,
-                include_domains=sites,
+            self.inflight[cache_key] = task
+            task.add_done_callback(
+                lambda done: self._forget_inflight(cache_key, done)
             )
+        else:
+            logger.info("🔗 Joining in-flight search: '%s'", query)
 
-            logger.info(f"📥 Received {len(search_results.get('results', []))} results")
-
-            if not search_results.get("results"):
-                logger.warning("⚠️ No search results returned")
-                return "No results found. Try a different search query or check if domains are accessible."
-
-            formatted_results = format_search_results(
-                search_results["results"][:final_max_results], self.max_content_size
+        # Shielded so one caller's cancellation doesn't cancel the others,
+        # the search is only cancelled once every caller has gone away
+        self.inflight_waiters[task] = self.inflight_waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            remaining = self.inflight_waiters.pop(task) - 1
+            if remaining:
+                self.inflight_waiters[task] = remaining
+            elif not task.done():
+                logger.info("🛑 Cancelling abandoned search: '%s'", query)
+                # Unregister first so a new identical search can't join it
+                self._forget_inflight(cache_key, task)
+                task.cancel()
+
+    def _forget_inflight(self, cache_key: str, task: asyncio.Task) -> None:
+        """Drop an in-flight entry unless it has been replaced by a newer search"""
+        if self.inflight.get(cache_key) is task:
+            del self.inflight[cache_key]
+
+    async def _search_uncoalesced(
+        self,
+        query: str,
+        sites: List[str],
+        final_max_results: int,
+        final_depth: str,
+        cache_key: str,
+    ) -> str:
+        """Run one search through the result cache, Tavily and the summarizer"""
+        try:
+            logger.info("🔍 Searching: '%s' on sites: %s", query, sites)
+            logger.info(
+                "📊 Parameters: max_results=%d, depth=%s", final_max_results, final_depth
             )
-            final_result = "\n".join(formatted_results)
 
-            logger.info(
-                f"✅ Processed {len(search_results['results'])} results, returning {len(final_result)} characters"
+            summary_key = f"{cache_key}:summary"
+            summarize = (
+                self.enable_summarization
+                and self.summarizer_llm
+                and self.return_mode != "raw"
             )
 
-            if self.enable_summarization and self.summarizer_llm:
-                try:
-                    logger.info("🧠 Summarizing results...")
-                    summarized_result = await self._summarize_results_async(final_result, query)
-                    reduction = round(
-                        (1 - len(summarized_result) / len(final_result)) * 100
+            if summarize and summary_key in self.result_cache:
+                logger.info("⚡ Search cache hit (summary)")
+                return self.result_cache[summary_key]
+
+            final_result = self.result_cache.get(cache_key)
+            if final_result is not None:
+                logger.info("⚡ Search cache hit")
+            else:
+                search_results = await self._tavily_search(
+                    query, sites, final_max_results, final_depth
+                )
+
+                logger.info(
+                    "📥 Received %d results", len(search_results.get("results", []))
+                )
+
+                if not search_results.get("results"):
+                    logger.warning("⚠️ No search results returned")
+                    return "No results found. Try a different search query or check if domains are accessible."
+
+                result_count = len(search_results["results"])
+                # Tavily already caps results at max_results, only slice if it didn't
+                if result_count > final_max_results:
+                    logger.warning(
+                        "⚠️ Tavily returned %d results for max_results=%d",
+                        result_count,
+                        final_max_results,
                     )
+                    del search_results["results"][final_max_results:]
+                    result_count = final_max_results
+                # CPU-bound hashing, kept off the event loop
+                unique_results = await asyncio.to_thread(
+                    _dedup_results, search_results["results"], self.max_content_size
+                )
+                if len(unique_results) < result_count:
                     logger.info(
-                        f"📊 Summarization: {len(final_result)} → {len(summarized_result)} chars ({reduction}% reduction)"
+                        "🧹 Dropped %d near-duplicate results",
+                        result_count - len(unique_results),
                     )
-                    return summarized_result
-                except Exception as e:
-                    logger.error(
-                        f"❌ Summarization failed: {e}. Returning original results."
+                # Split the token budget evenly across the requested results
+                final_result = format_search_results(
+                    unique_results,
+                    self.max_content_size,
+                    self.search_token_budget // final_max_results,
+                )
+                # Free the raw response before the (slow) summarization wait
+                del search_results
+                self.result_cache[cache_key] = final_result
+
+                logger.info(
+                    "✅ Processed %d results, returning %d characters",
+                    result_count,
+                    len(final_result),
+                )
+
+            if summarize and self.return_mode == "both":
+                # Return raw results now, the summary lands in the cache for repeats
+                if summary_key not in self.background_summaries:
+                    task = asyncio.create_task(
+                        self._summarize_and_cache(final_result, query, summary_key)
                     )
+                    self.background_summaries[summary_key] = task
+                    task.add_done_callback(
+                        lambda _: self.background_summaries.pop(summary_key, None)
+                    )
+            elif summarize:
+                return await self._summarize_and_cache(final_result, query, summary_key)
 
             return final_result
 
         except Exception as e:
             error_msg = f"❌ Search error: {str(e)}"
-            logger.error(error_msg)
+            logger.error("%s", error_msg)
             return error_msg
 
+    async def _summarize_and_cache(
+        self, final_result: str, query: str, summary_key: str
+    ) -> str:
+        """Summarize formatted results, caching the summary on success"""
+        try:
+            logger.info("🧠 Summarizing results...")
+            summarized_result = await self._summarize_results_async(final_result, query)
+            if summarized_result is not final_result:
+                self.result_cache[summary_key] = summarized_result
+            if logger.isEnabledFor(logging.INFO):
+                reduction = round(
+                    (1 - len(summarized_result) / len(final_result)) * 100
+                )
+                logger.info(
+                    "📊 Summarization: %d → %d chars (%d%% reduction)",
+                    len(final_result),
+                    len(summarized_result),
+                    reduction,
+                )
+            return summarized_result
+        except Exception as e:
+            logger.error(
+                "❌ Summarization failed: %s. Returning original results.", e
+            )
+            return final_result
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get the shared client, or the tool's own client for the running loop"""
+        if self.http_client is not None:
+            return self.http_client
+
+        # Pooled connections are bound to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self.owned_client is None or self.owned_client_loop is not loop:
+            object.__setattr__(
+                self, "owned_client", create_http_client(self.request_timeout)
+            )
+            object.__setattr__(self, "owned_client_loop", loop)
+        return self.owned_client
+
+    async def aclose(self) -> None:
+        """Cancel background summaries and close the HTTP client owned by the tool.
+
+        A shared client is left open, but the summaries may be using it, so
+        they are cancelled here before the application closes it.
+        """
+        pending = list(self.background_summaries.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if self.owned_client is not None:
+            await self.owned_client.aclose()
+            object.__setattr__(self, "owned_client", None)
+            object.__setattr__(self, "owned_client_loop", None)
+
+    async def _tavily_search(
+        self, query: str, sites: List[str], max_results: int, depth: str
+    ) -> dict:
+        """Call the Tavily search API"""
+        response = await self._get_http_client().post(
+            TAVILY_SEARCH_URL,
+            content=orjson.dumps(
+                {
+                    "query": query,
+                    "max_results": max_results,
+                    "search_depth": depth,
+                    "include_domains": sites,
+                }
+            ),
+            headers=self.request_headers,
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    async def _astream_summary(
+        self, search_results: str, original_query: str
+    ) -> AsyncIterator[str]:
+        """Stream summary tokens as the LLM produces them"""
+        prompt = create_summary_prompt(search_results, original_query)
+        async for chunk in self.summarizer_llm.astream(
+            prompt, config={"tags": [SUMMARIZER_TAG]}
+        ):
+            if chunk.content:
+                yield chunk.content
+
     async def _summarize_results_async(self, search_results: str, original_query: str) -> str:
         """Summarize search results using LLM asynchronously"""
         try:
-            prompt = create_summary_prompt(search_results, original_query)
-            response = await asyncio.to_thread(self.summarizer_llm.invoke, prompt)
-            return response.content
+            chunks = [
+                chunk
+                async for chunk in self._astream_summary(search_results, original_query)
+            ]
+            return "".join(chunks)
         except Exception as e:
-            logger.error(f"LLM summarization failed: {e}")
+            logger.error("LLM summarization failed: %s", e)
             return search_results
 
     def _run(
         self, query: str, sites: List[str], max_results: int = None, depth: str = None
     ) -> str:
         """Execute search with given parameters"""
-        return asyncio.run(self._search_async(query, sites, max_results, depth))
+        ensure_no_running_loop(self.name)
+
+        async def search_once() -> str:
+            # The event loop dies with asyncio.run, so the owned client goes too
+            try:
+                return await self._search_async(query, sites, max_results, depth)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(search_once())
 
     async def _arun(
         self, query: str, sites: List[str], max_results: int = None, depth: str = None
     ) -> str:
         """Async version of search"""
-        logger.info(f"🔍 Async search: '{query}'")
+        logger.info("🔍 Async search: '%s'", query)
         return await self._search_async(query, sites, max_results, depth)
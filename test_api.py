@@ -3,64 +3,52 @@
 Simple test script for the QA Agent API
 """
 
-import requests
-import json
-import time
+import asyncio
 
-def test_health():
+import aiohttp
+
+BASE_URL = "http://localhost:8000"
+
+
+async def check_health(session: aiohttp.ClientSession) -> bool:
     """Test the health endpoint"""
     try:
-        response = requests.get("http://localhost:8000/health")
-        print(f"✅ Health check: {response.status_code}")
-        print(f"   Response: {response.json()}")
-        return True
+        async with session.get(f"{BASE_URL}/health") as response:
+            print(f"✅ Health check: {response.status}")
+            print(f"   Response: {await response.json()}")
+            return True
     except Exception as e:
         print(f"❌ Health check failed: {e}")
         return False
 
-def test_chat():
+
+async def check_chat(session: aiohttp.ClientSession) -> bool:
     """Test the chat endpoint"""
     try:
         data = {
             "message": "What is LangChain?",
             "reset_memory": False
         }
-        
-        response = requests.post(
-            "http://localhost:8000/chat",
-            json=data,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        print(f"✅ Chat test: {response.status_code}")
-        result = response.json()
-        print(f"   Session ID: {result.get('session_id', 'N/A')}")
-        print(f"   Response preview: {result.get('response', '')[:100]}...")
-        return True
+
+        async with session.post(f"{BASE_URL}/chat", json=data) as response:
+            print(f"✅ Chat test: {response.status}")
+            result = await response.json()
+            print(f"   Session ID: {result.get('session_id', 'N/A')}")
+            print(f"   Response preview: {result.get('response', '')[:100]}...")
+            return True
     except Exception as e:
         print(f"❌ Chat test failed: {e}")
         return False
 
-def test_reset():
-    """Test the reset endpoint"""
+
+async def check_reset(session: aiohttp.ClientSession) -> bool:
+    """Test the reset endpoint on the session created by the chat test"""
     try:
-        # First make a chat request to create a session
-        chat_response = requests.post(
-            "http://localhost:8000/chat",
-            json={"message": "Hello", "reset_memory": False}
-        )
-        
-        # Get session cookie
-        session_cookie = chat_response.cookies.get("session_id")
-        
-        if session_cookie:
-            # Test reset with session cookie
-            reset_response = requests.post(
-                "http://localhost:8000/reset",
-                cookies={"session_id": session_cookie}
-            )
-            print(f"✅ Reset test: {reset_response.status_code}")
-            return True
+        # The client cookie jar already holds the session cookie set by /chat
+        if "session_id" in session.cookie_jar.filter_cookies(BASE_URL):
+            async with session.post(f"{BASE_URL}/reset") as reset_response:
+                print(f"✅ Reset test: {reset_response.status}")
+                return True
         else:
             print("⚠️ No session cookie found for reset test")
             return False
@@ -68,33 +56,38 @@ def test_reset():
         print(f"❌ Reset test failed: {e}")
         return False
 
+
+async def run_tests() -> tuple[int, int]:
+    """Run independent tests concurrently, then reset on the chat session"""
+    # unsafe=True keeps cookies when BASE_URL is an IP address
+    cookie_jar = aiohttp.CookieJar(unsafe=True)
+    async with aiohttp.ClientSession(cookie_jar=cookie_jar) as session:
+        print("\n🔍 Testing: Health Check, Chat Endpoint")
+        health_ok, chat_ok = await asyncio.gather(
+            check_health(session), check_chat(session)
+        )
+
+        print("\n🔍 Testing: Reset Endpoint")
+        reset_ok = await check_reset(session)
+
+    results = [health_ok, chat_ok, reset_ok]
+    return sum(results), len(results)
+
+
 def main():
     """Run all tests"""
     print("🧪 Testing QA Agent API...")
     print("=" * 50)
-    
-    tests = [
-        ("Health Check", test_health),
-        ("Chat Endpoint", test_chat),
-        ("Reset Endpoint", test_reset),
-    ]
-    
-    passed = 0
-    total = len(tests)
-    
-    for test_name, test_func in tests:
-        print(f"\n🔍 Testing: {test_name}")
-        if test_func():
-            passed += 1
-        time.sleep(1)  # Small delay between tests
-    
+
+    passed, total = asyncio.run(run_tests())
+
     print("\n" + "=" * 50)
     print(f"📊 Test Results: {passed}/{total} passed")
-    
+
     if passed == total:
         print("🎉 All tests passed! API is working correctly.")
     else:
         print("⚠️ Some tests failed. Check the logs above.")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,17 @@
+"""
+Helpers shared by the search and scraping tools
+"""
+
+import asyncio
+
+
+def ensure_no_running_loop(tool_name: str) -> None:
+    """Raise if a sync tool entry point is called inside a running event loop"""
+    # ASGI apps and other running loops must use the tool's _arun instead
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(
+        f"{tool_name} was called synchronously inside a running event loop; use _arun"
+    )